@@ -1,13 +1,26 @@
-from flask import Flask, render_template, request, redirect, url_for, g, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, g, session, flash, jsonify, abort, Response, stream_with_context
 import sqlite3
 import os
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+from itsdangerous import URLSafeSerializer, BadSignature
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+import queries
+from broker import Broker
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 DATABASE = "community_connect.db"
+SSE_KEEPALIVE_SECONDS = 15
+
+# Fans signup changes out to the live streams open in this process
+signup_broker = Broker()
+# Held across commit + publish so that streams receive changes in Seq order
+signup_publish_lock = threading.Lock()
 
 # ====================
 # DB HELPERS
@@ -24,7 +37,7 @@ def get_db():
 @app.teardown_appcontext
 def close_connection(exception):
     """Closes the database connection at the end of the request."""
-    db = getattr(g, "_database", None)
+    db = g.pop("_database", None)
     if db is not None:
         db.close()
 
@@ -42,6 +55,45 @@ def init_db():
                     db.executescript(f.read())
             db.commit()
 
+def touch_feeds(db, account_type, account_ids):
+    """Bumps the calendar feed change stamp for each of the given accounts."""
+    db.executemany(
+        """INSERT INTO FeedStamps (AccountType, AccountID, Version, ModifiedAt)
+           VALUES (?, ?, 1, strftime('%s', 'now'))
+           ON CONFLICT (AccountType, AccountID) DO UPDATE SET Version = Version + 1, ModifiedAt = excluded.ModifiedAt""",
+        [(account_type, account_id) for account_id in set(account_ids)]
+    )
+
+def touch_event_feeds(db, org_id, event_id=None):
+    """Bumps the feeds of an organisation and of the volunteers accepted for one (or all) of its events."""
+    query = """SELECT s.VolunteerID FROM Signups s JOIN Events e ON s.EventID = e.EventID
+               WHERE e.OrganisationID = ? AND s.Status = 'Accepted'"""
+    params = [org_id]
+    if event_id is not None:
+        query += " AND e.EventID = ?"
+        params.append(event_id)
+    touch_feeds(db, "organisation", [org_id])
+    touch_feeds(db, "volunteer", [row["VolunteerID"] for row in db.execute(query, params)])
+
+def log_signup_change(db, signup_id, action):
+    """Appends the current state of a signup to the SignupChanges log and returns its sequence number."""
+    return db.execute(
+        """INSERT INTO SignupChanges (Action, SignupID, EventID, VolunteerID, RoleID, Status, ChangedAt)
+           SELECT ?, SignupID, EventID, VolunteerID, RoleID, Status, strftime('%s', 'now') FROM Signups WHERE SignupID = ?""",
+        (action, signup_id)
+    ).lastrowid
+
+def commit_signup_change(db, seq):
+    """Commits a logged signup change and pushes it to the live streams of its event and volunteer."""
+    with signup_publish_lock:
+        db.commit()
+        change = queries.signup_change.one(db, (seq,))
+        signup_broker.publish([("event", change.EventID), ("volunteer", change.VolunteerID)], change)
+
+def latest_signup_change(db):
+    """Returns the sequence number of the most recent signup change."""
+    return db.execute("SELECT COALESCE(MAX(Seq), 0) FROM SignupChanges").fetchone()[0]
+
 # ====================
 # AUTH & ROLE DECORATORS
 # ====================
@@ -193,14 +245,16 @@ def register_organisation_page():
 def volunteer_dashboard():
     """Displays the volunteer's dashboard."""
     db = get_db()
+    since = latest_signup_change(db)
     signups = db.execute(
-        """SELECT s.Status, e.Name AS EventName, e.Date, e.Location, o.Name AS OrgName, s.EventID
+        """SELECT s.SignupID, s.Status, e.Name AS EventName, e.Date, e.Location, o.Name AS OrgName, s.EventID
            FROM Signups s JOIN Events e ON s.EventID = e.EventID
            JOIN Organisations o ON e.OrganisationID = o.OrganisationID
            WHERE s.VolunteerID = ?
            ORDER BY date(e.Date) ASC""", (session["user_id"],)
     ).fetchall()
-    return render_template("volunteer_dashboard.html", signups=signups)
+    feed_url = url_for("volunteer_calendar_feed", token=calendar_token("volunteer", session["user_id"]), _external=True)
+    return render_template("volunteer_dashboard.html", signups=signups, feed_url=feed_url, since=since)
 
 @app.route("/volunteer/account/edit", methods=["GET", "POST"])
 @login_required
@@ -318,7 +372,8 @@ def organisation_dashboard():
     """Displays the organisation's dashboard."""
     db = get_db()
     events = db.execute("SELECT EventID, Name, Description, Date, Location FROM Events WHERE OrganisationID = ? ORDER BY date(Date) ASC", (session["user_id"],)).fetchall()
-    return render_template("organisation_dashboard.html", events=events)
+    feed_url = url_for("organisation_calendar_feed", token=calendar_token("organisation", session["user_id"]), _external=True)
+    return render_template("organisation_dashboard.html", events=events, feed_url=feed_url)
 
 @app.route("/org/account/edit", methods=["GET", "POST"])
 @login_required
@@ -361,6 +416,7 @@ def edit_org_account():
             update_params = [name, description, phone, website, contact_person, address, logo, hashed_password, session["user_id"]]
 
         db.execute(update_query, tuple(update_params))
+        touch_event_feeds(db, session["user_id"])
         db.commit()
         
         session["name"] = name
@@ -406,6 +462,7 @@ def view_event_signups(event_id):
         flash("Event not found or not authorised.", "error")
         return redirect(url_for("list_events"))
 
+    since = latest_signup_change(db)
     signups = db.execute(
         """SELECT s.SignupID, s.Status, v.VolunteerID, v.FirstName, v.LastName, v.Email, v.Phone, r.RoleID, r.Name AS RoleName, r.Description AS RoleDescription
            FROM Signups s
@@ -415,7 +472,7 @@ def view_event_signups(event_id):
     ).fetchall()
     
     roles = db.execute("SELECT RoleID, Name FROM Roles").fetchall()
-    return render_template("view_signups.html", event=event, signups=signups, roles=roles)
+    return render_template("view_signups.html", event=event, signups=signups, roles=roles, since=since)
 
 @app.route("/signups/<int:signup_id>/update_status_and_role", methods=["POST"])
 @login_required
@@ -440,7 +497,9 @@ def update_signup_status_and_role(signup_id):
         role_id = None
     
     db.execute("UPDATE Signups SET Status = ?, RoleID = ? WHERE SignupID = ?", (status, role_id, signup_id))
-    db.commit()
+    seq = log_signup_change(db, signup_id, "update")
+    touch_feeds(db, "volunteer", [signup["VolunteerID"]])
+    commit_signup_change(db, seq)
     flash("Volunteer signup status and role updated successfully.", "success")
     return redirect(url_for('view_event_signups', event_id=event["EventID"]))
 
@@ -456,28 +515,13 @@ def list_events():
     user_id = session.get('user_id')
     account_type = session.get('account_type')
 
+    # Rows are streamed from the cursors while the template renders
     if account_type == 'organisation':
-        my_events = db.execute(
-            """SELECT e.*, o.Name AS OrgName
-               FROM Events e 
-               JOIN Organisations o ON e.OrganisationID = o.OrganisationID
-               WHERE e.OrganisationID = ? ORDER BY e.Date""", (user_id,)
-        ).fetchall()
-        other_events = db.execute(
-            """SELECT e.*, o.Name AS OrgName
-               FROM Events e 
-               JOIN Organisations o ON e.OrganisationID = o.OrganisationID
-               WHERE e.OrganisationID != ? ORDER BY e.Date""", (user_id,)
-        ).fetchall()
+        my_events = queries.list_own_events.iter(db, (user_id,))
+        other_events = queries.list_other_events.iter(db, (user_id,))
         return render_template("list_events.html", my_events=my_events, other_events=other_events)
     elif account_type == 'volunteer':
-        events = db.execute(
-            """SELECT e.*, o.Name AS OrgName, s.Status AS signup_status
-               FROM Events e
-               JOIN Organisations o ON e.OrganisationID = o.OrganisationID
-               LEFT JOIN Signups s ON e.EventID = s.EventID AND s.VolunteerID = ?
-               ORDER BY e.Date""", (user_id,)
-        ).fetchall()
+        events = queries.list_events_for_volunteer.iter(db, (user_id,))
         return render_template("list_events.html", events=events)
     return redirect(url_for('login'))
 
@@ -533,8 +577,9 @@ def signup_for_event(event_id):
     if existing_signup:
         flash("You are already signed up for this event.", "info")
     else:
-        db.execute("INSERT INTO Signups (VolunteerID, EventID, Status) VALUES (?, ?, 'Pending')", (session["user_id"], event_id))
-        db.commit()
+        signup_id = db.execute("INSERT INTO Signups (VolunteerID, EventID, Status) VALUES (?, ?, 'Pending')", (session["user_id"], event_id)).lastrowid
+        seq = log_signup_change(db, signup_id, "insert")
+        commit_signup_change(db, seq)
         flash("Successfully signed up for the event! Your status is 'Pending'.", "success")
     return redirect(url_for("list_events"))
 
@@ -545,10 +590,11 @@ def retract_signup(event_id):
     """Allows a volunteer to retract their pending signup for an event."""
     db = get_db()
     volunteer_id = session.get('user_id')
-    signup = db.execute("""SELECT Status FROM Signups WHERE VolunteerID = ? AND EventID = ?""", (volunteer_id, event_id)).fetchone()
+    signup = db.execute("""SELECT SignupID, Status FROM Signups WHERE VolunteerID = ? AND EventID = ?""", (volunteer_id, event_id)).fetchone()
     if signup and signup['Status'] != 'Accepted':
+        seq = log_signup_change(db, signup["SignupID"], "delete")
         db.execute("DELETE FROM Signups WHERE VolunteerID = ? AND EventID = ?", (volunteer_id, event_id))
-        db.commit()
+        commit_signup_change(db, seq)
         flash("Your signup has been retracted.", "success")
     elif signup and signup['Status'] == 'Accepted':
         flash("Cannot retract signup after it has been accepted.", "error")
@@ -580,6 +626,7 @@ def edit_event(event_id):
         selected_skills = request.form.getlist("skills")
         for skill_id in selected_skills:
             db.execute("INSERT INTO EventSkills (EventID, SkillID) VALUES (?, ?)", (event_id, int(skill_id)))
+        touch_event_feeds(db, session["user_id"], event_id)
         db.commit()
         flash("Event updated.", "success")
         return redirect(url_for("edit_event", event_id=event_id))
@@ -603,6 +650,7 @@ def add_event():
         selected_skills = request.form.getlist("skills")
         for skill_id in selected_skills:
             db.execute("INSERT INTO EventSkills (EventID, SkillID) VALUES (?, ?)", (event_id, int(skill_id)))
+        touch_feeds(db, "organisation", [session["user_id"]])
         db.commit()
         flash("Event created.", "success")
         return redirect(url_for("list_events"))
@@ -614,11 +662,180 @@ def add_event():
 def delete_event(event_id):
     """Deletes an event from the database."""
     db = get_db()
+    touch_event_feeds(db, session["user_id"], event_id)
     db.execute("DELETE FROM Events WHERE EventID=? AND OrganisationID=?", (event_id, session["user_id"]))
     db.commit()
     flash("Event deleted.", "success")
     return redirect(url_for("list_events"))
 
+# ====================
+# LIVE SIGNUP UPDATES
+# ====================
+
+def stream_start(db):
+    """Returns the sequence number a stream resumes after: Last-Event-ID, ?since or the latest change."""
+    since = request.headers.get("Last-Event-ID") or request.args.get("since", "")
+    return int(since) if since.isdigit() else latest_signup_change(db)
+
+def stream_signup_changes(channel, replay_query, since):
+    """Streams the signup changes on a channel after sequence number since as Server-Sent Events."""
+    # Subscribe before reading the log so that nothing committed in between is missed
+    subscription = signup_broker.subscribe(channel)
+    backlog = replay_query.all(get_db(), (channel[1], since))
+
+    def message(change):
+        return f"id: {change.Seq}\nevent: signup\ndata: {json.dumps(change._asdict())}\n\n"
+
+    # Live changes up to here were already covered by the replay
+    replayed_seq = backlog[-1].Seq if backlog else since
+
+    def generate():
+        for change in backlog:
+            yield message(change)
+        while not subscription.closed:
+            try:
+                change = subscription.get(SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if change.Seq > replayed_seq:
+                yield message(change)
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.call_on_close(lambda: signup_broker.unsubscribe(subscription))
+    return response
+
+@app.route("/events/<int:event_id>/signups/stream")
+@login_required
+@org_required
+def event_signups_stream(event_id):
+    """Streams live signup changes for one of the organisation's events."""
+    db = get_db()
+    event = db.execute("SELECT 1 FROM Events WHERE EventID=? AND OrganisationID=?", (event_id, session["user_id"])).fetchone()
+    if not event:
+        abort(404)
+    return stream_signup_changes(("event", event_id), queries.signup_changes_for_event, stream_start(db))
+
+@app.route("/volunteer/signups/stream")
+@login_required
+@volunteer_required
+def volunteer_signups_stream():
+    """Streams live changes to the volunteer's own signups."""
+    return stream_signup_changes(("volunteer", session["user_id"]), queries.signup_changes_for_volunteer, stream_start(get_db()))
+
+# ====================
+# CALENDAR FEEDS
+# ====================
+
+def calendar_token(account_type, user_id):
+    """Returns the signed token that authenticates an account's calendar feed."""
+    return URLSafeSerializer(app.secret_key, salt=f"calendar-{account_type}").dumps(user_id)
+
+def calendar_user_id(account_type, token):
+    """Returns the account ID a feed token was issued for, or aborts with a 404."""
+    try:
+        return URLSafeSerializer(app.secret_key, salt=f"calendar-{account_type}").loads(token)
+    except BadSignature:
+        abort(404)
+
+def ics_escape(text):
+    """Escapes a TEXT value for use in an iCalendar property."""
+    text = str(text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+    return text.replace("\r\n", "\\n").replace("\n", "\\n")
+
+def ics_line(line):
+    """Folds a content line to 75 octets per line as required by RFC 5545."""
+    data = line.encode("utf-8")
+    chunks = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while data[cut] & 0xC0 == 0x80:  # don't split a multi-byte character
+            cut -= 1
+        chunks.append(data[:cut])
+        data = data[cut:]
+        limit = 74  # continuation lines start with a space
+    chunks.append(data)
+    return b"\r\n ".join(chunks).decode("utf-8") + "\r\n"
+
+def ics_time(date, time):
+    """Formats an event date and optional time as a DTSTART/DTEND value."""
+    day = date.replace("-", "")
+    if not time:
+        return ";VALUE=DATE:" + day
+    hours, minutes, seconds = (time.split(":") + ["00", "00"])[:3]
+    return f":{day}T{hours.zfill(2)}{minutes.zfill(2)}{seconds.zfill(2)}"
+
+def ics_events(rows, dtstamp):
+    """Yields a VCALENDAR document one VEVENT at a time from the given event rows."""
+    yield ics_line("BEGIN:VCALENDAR")
+    yield ics_line("VERSION:2.0")
+    yield ics_line("PRODID:-//Community Connect//Calendar Feed//EN")
+    yield ics_line("CALSCALE:GREGORIAN")
+    for row in rows:
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:event-{row['EventID']}@community-connect",
+            f"DTSTAMP:{dtstamp}",
+            "DTSTART" + ics_time(row["Date"], row["StartTime"]),
+        ]
+        if row["StartTime"] and row["EndTime"]:
+            lines.append("DTEND" + ics_time(row["Date"], row["EndTime"]))
+        lines.append("SUMMARY:" + ics_escape(row["Name"]))
+        if row["Location"]:
+            lines.append("LOCATION:" + ics_escape(row["Location"]))
+        description = f"Organised by {row['OrgName']}.\n\n{row['Description'] or ''}".strip()
+        lines.append("DESCRIPTION:" + ics_escape(description))
+        lines.append("URL:" + url_for("view_event", event_id=row["EventID"], _external=True))
+        lines.append("END:VEVENT")
+        yield "".join(ics_line(line) for line in lines)
+    yield ics_line("END:VCALENDAR")
+
+def calendar_feed(account_type, user_id, query):
+    """Streams an account's .ics feed, answering with a 304 when its change stamp hasn't moved."""
+    db = get_db()
+    stamp_query = "SELECT Version, ModifiedAt FROM FeedStamps WHERE AccountType = ? AND AccountID = ?"
+    stamp = db.execute(stamp_query, (account_type, user_id)).fetchone()
+    if not stamp:
+        touch_feeds(db, account_type, [user_id])
+        db.commit()
+        stamp = db.execute(stamp_query, (account_type, user_id)).fetchone()
+    modified_at = datetime.fromtimestamp(stamp["ModifiedAt"], timezone.utc)
+
+    def generate():
+        # Only runs when the client's copy is stale, so a 304 never touches the Events table.
+        yield from ics_events(get_db().execute(query, (user_id,)), modified_at.strftime("%Y%m%dT%H%M%SZ"))
+
+    response = Response(stream_with_context(generate()), mimetype="text/calendar")
+    response.automatically_set_content_length = False  # would drain the generator to measure it
+    response.headers["Content-Disposition"] = f"inline; filename={account_type}-calendar.ics"
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.set_etag(f"{account_type}-{user_id}-{stamp['Version']}")
+    response.last_modified = modified_at
+    return response.make_conditional(request)
+
+@app.route("/volunteer/calendar/<token>.ics")
+def volunteer_calendar_feed(token):
+    """Serves the calendar feed of a volunteer's accepted event signups."""
+    return calendar_feed("volunteer", calendar_user_id("volunteer", token),
+        """SELECT e.EventID, e.Name, e.Description, e.Date, e.StartTime, e.EndTime, e.Location, o.Name AS OrgName
+           FROM Signups s JOIN Events e ON s.EventID = e.EventID
+           JOIN Organisations o ON e.OrganisationID = o.OrganisationID
+           WHERE s.VolunteerID = ? AND s.Status = 'Accepted' AND e.Date IS NOT NULL
+           ORDER BY date(e.Date) ASC""")
+
+@app.route("/organisation/calendar/<token>.ics")
+def organisation_calendar_feed(token):
+    """Serves the calendar feed of all events run by an organisation."""
+    return calendar_feed("organisation", calendar_user_id("organisation", token),
+        """SELECT e.EventID, e.Name, e.Description, e.Date, e.StartTime, e.EndTime, e.Location, o.Name AS OrgName
+           FROM Events e JOIN Organisations o ON e.OrganisationID = o.OrganisationID
+           WHERE e.OrganisationID = ? AND e.Date IS NOT NULL
+           ORDER BY date(e.Date) ASC""")
+
 # ====================
 # GENERAL ROUTES
 # ====================
@@ -639,20 +856,10 @@ def list_volunteers():
     """Lists all volunteers, with optional filtering by skill name."""
     db = get_db()
     search_query = request.args.get('q', '')
-    query = """
-        SELECT V.VolunteerID, V.FirstName ||' '|| V.LastName AS Fullname,
-               (strftime('%Y', 'now') - strftime('%Y', DateOfBirth)) - (CASE WHEN strftime('%m-%d', 'now') < strftime('%m-%d', DateOfBirth) THEN 1 ELSE 0 END) AS Age,
-               V.Email, V.Phone, V.Availability, GROUP_CONCAT(S.Name) AS Skills
-        FROM Volunteers V
-        LEFT JOIN VolunteerSkills VS ON V.VolunteerID = VS.VolunteerID
-        LEFT JOIN Skills S ON VS.SkillID = S.SkillID
-    """
-    params = []
     if search_query:
-        query += " WHERE S.Name LIKE ?"
-        params.append('%' + search_query + '%')
-    query += " GROUP BY V.VolunteerID ORDER BY V.FirstName"
-    volunteers = db.execute(query, params).fetchall()
+        volunteers = queries.list_volunteers_by_skill.iter(db, ('%' + search_query + '%',))
+    else:
+        volunteers = queries.list_volunteers.iter(db)
     return render_template("list_volunteers.html", volunteers=volunteers, query=search_query)
 
 @app.route("/volunteers/stats", methods=["GET", "POST"])
@@ -0,0 +1,112 @@
+"""Micro-benchmark of the typed rows in queries.py against sqlite3.Row.
+
+Builds an in-memory database of 100k volunteers, then compares the memory held
+by the volunteer listing and the time taken to render it for:
+
+  * sqlite3.Row rows materialised with fetchall() and a comma-joined skill string
+  * namedtuple rows materialised with fetchall() and parsed skill tuples
+  * namedtuple rows iterated lazily from the cursor
+
+Run with: python benchmark.py [row_count]
+"""
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+from jinja2 import Environment
+
+import queries
+
+SKILLS = ["First Aid", "Gardening", "Cooking", "Tutoring", "Driving", "Event Planning", "IT Support", "Fundraising"]
+
+BASELINE_SQL = """
+    SELECT V.VolunteerID, V.FirstName ||' '|| V.LastName AS Fullname,
+           (strftime('%Y', 'now') - strftime('%Y', DateOfBirth)) - (CASE WHEN strftime('%m-%d', 'now') < strftime('%m-%d', DateOfBirth) THEN 1 ELSE 0 END) AS Age,
+           V.Email, V.Phone, V.Availability, GROUP_CONCAT(S.Name) AS Skills
+    FROM Volunteers V
+    LEFT JOIN VolunteerSkills VS ON V.VolunteerID = VS.VolunteerID
+    LEFT JOIN Skills S ON VS.SkillID = S.SkillID
+    GROUP BY V.VolunteerID ORDER BY V.FirstName"""
+
+# The row markup of list_volunteers.html before and after the switch to skill tuples
+ROW_TEMPLATE = """{% for volunteer in volunteers %}<tr><td>{{ volunteer.Fullname }}</td><td>{{ volunteer.Email }}</td><td>{{ volunteer.Age }}</td><td>{{ volunteer.Phone or 'N/A' }}</td><td>{% if volunteer.Availability %}Available{% else %}Not Available{% endif %}</td><td>{SKILLS}</td></tr>{% endfor %}"""
+BASELINE_SKILLS = """{% if volunteer.Skills %}{% for skill in volunteer.Skills.split(',') %}<span>{{ skill.strip() }}</span>{% endfor %}{% else %}N/A{% endif %}"""
+TYPED_SKILLS = """{% for skill in volunteer.Skills %}<span>{{ skill }}</span>{% else %}N/A{% endfor %}"""
+
+
+def build_db(row_count):
+    """Creates an in-memory database from schema.sql holding row_count volunteers."""
+    db = sqlite3.connect(":memory:")
+    with open("schema.sql", "r") as f:
+        db.executescript(f.read())
+    db.executemany("INSERT INTO Skills (Name) VALUES (?)", [(name,) for name in SKILLS])
+    rng = random.Random(0)
+    db.executemany(
+        """INSERT INTO Volunteers (FirstName, LastName, Email, Password, Phone, DateOfBirth, Availability)
+           VALUES (?, ?, ?, 'x', ?, ?, ?)""",
+        ((f"First{i}", f"Last{i}", f"volunteer{i}@example.com", f"04{i:08d}",
+          f"{rng.randint(1950, 2008)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", i % 2)
+         for i in range(row_count))
+    )
+    db.executemany(
+        "INSERT OR IGNORE INTO VolunteerSkills (VolunteerID, SkillID) VALUES (?, ?)",
+        ((i, rng.randint(1, len(SKILLS))) for i in range(1, row_count + 1) for _ in range(rng.randint(0, 3)))
+    )
+    db.commit()
+    return db
+
+
+def baseline_rows(db):
+    db.row_factory = sqlite3.Row
+    return db.execute(BASELINE_SQL).fetchall()
+
+
+def typed_rows(db):
+    return queries.list_volunteers.all(db)
+
+
+def lazy_rows(db):
+    return queries.list_volunteers.iter(db)
+
+
+def render(load, template, db):
+    """Loads the listing and streams it through the template, returning the output size."""
+    size = 0
+    for chunk in template.generate(volunteers=load(db)):
+        size += len(chunk)
+    return size
+
+
+def measure(label, load, template, db, row_count):
+    """Prints the peak memory and the load + render time of one way of loading the listing."""
+    tracemalloc.start()
+    render(load, template, db)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Timed separately, as tracemalloc slows every allocation down
+    start = time.perf_counter()
+    size = render(load, template, db)
+    elapsed = time.perf_counter() - start
+    per_100k = peak * 100_000 / row_count / 1024 / 1024
+    print(f"{label:<28} {per_100k:>10.2f} MiB {elapsed:>10.3f} s {size:>12,}")
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    db = build_db(row_count)
+    env = Environment(autoescape=True)
+    baseline_template = env.from_string(ROW_TEMPLATE.replace("{SKILLS}", BASELINE_SKILLS))
+    typed_template = env.from_string(ROW_TEMPLATE.replace("{SKILLS}", TYPED_SKILLS))
+
+    print(f"{row_count:,} volunteers (peak memory scaled to 100k rows; render streams the output without keeping it)")
+    print(f"{'approach':<28} {'peak mem':>14} {'total':>12} {'html chars':>12}")
+    measure("sqlite3.Row + fetchall", baseline_rows, baseline_template, db, row_count)
+    measure("namedtuple + fetchall", typed_rows, typed_template, db, row_count)
+    measure("namedtuple, lazy", lazy_rows, typed_template, db, row_count)
+
+
+if __name__ == "__main__":
+    main()
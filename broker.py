@@ -0,0 +1,64 @@
+"""In-process publish/subscribe used to push signup changes to live streams.
+
+Each open Server-Sent Events stream holds a Subscription on a channel such as
+("event", 3) or ("volunteer", 7). A change is published once and copied onto
+the queue of every subscriber of its channels, so no stream has to poll the
+database to find out that something happened.
+"""
+import queue
+import threading
+
+
+class Subscription:
+    """A queue of changes for one listener, closed if it falls too far behind."""
+    __slots__ = ("channels", "queue", "closed")
+
+    def __init__(self, channels, maxsize):
+        self.channels = channels
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+    def get(self, timeout):
+        """Returns the next change, raising queue.Empty if none arrives in time."""
+        return self.queue.get(timeout=timeout)
+
+
+class Broker:
+    """Fans published changes out to the subscribers of each channel."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, *channels):
+        """Registers and returns a new subscription to the given channels."""
+        subscription = Subscription(channels, self.maxsize)
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Removes a subscription from all of its channels."""
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channels, change):
+        """Queues a change for every subscriber of any of the given channels."""
+        with self._lock:
+            subscriptions = set()
+            for channel in channels:
+                subscriptions.update(self._subscribers.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(change)
+            except queue.Full:
+                # A stalled listener is dropped; its client reconnects and replays from the log
+                subscription.closed = True
+                self.unsubscribe(subscription)
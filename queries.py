@@ -0,0 +1,146 @@
+"""Named queries that return compact, typed rows for the listing routes.
+
+Each query is a named module-level constant pairing its SQL with a row type.
+The statements are not compiled ahead of time: get_db() opens a fresh
+connection per request, so sqlite3 prepares them again on each request. Rows
+come back as namedtuples instead of sqlite3.Row objects and can be iterated
+lazily straight from the cursor while the template renders.
+"""
+from collections import namedtuple
+
+# Separator used by GROUP_CONCAT so that skill names containing commas survive parsing
+SKILL_SEPARATOR = "\x1f"
+
+VolunteerListing = namedtuple("VolunteerListing", "VolunteerID Fullname Age Email Phone Availability Skills")
+EventListing = namedtuple("EventListing", "EventID Name Date Location Status OrgName")
+VolunteerEventListing = namedtuple("VolunteerEventListing", "EventID Name Date Location Status OrgName signup_status")
+
+
+def parse_skills(skills):
+    """Turns a GROUP_CONCAT of skill names into a tuple of names."""
+    return tuple(skills.split(SKILL_SEPARATOR)) if skills else ()
+
+
+class Query:
+    """A named SQL statement paired with the row type it produces."""
+    __slots__ = ("name", "sql", "row_type", "convert")
+
+    def __init__(self, name, sql, row_type, convert=None):
+        self.name = name
+        self.sql = sql
+        self.row_type = row_type
+        self.convert = convert
+
+    def __repr__(self):
+        return f"<Query {self.name}>"
+
+    def _make_row(self, cursor, row):
+        if self.convert is not None:
+            row = self.convert(row)
+        return self.row_type._make(row)
+
+    def iter(self, db, params=()):
+        """Runs the query and lazily yields typed rows as the cursor is read."""
+        cursor = db.cursor()
+        cursor.row_factory = self._make_row
+        return cursor.execute(self.sql, params)
+
+    def all(self, db, params=()):
+        """Runs the query and returns every typed row as a list."""
+        return self.iter(db, params).fetchall()
+
+    def one(self, db, params=()):
+        """Runs the query and returns the first typed row, or None."""
+        return self.iter(db, params).fetchone()
+
+
+def _with_parsed_skills(row):
+    return row[:-1] + (parse_skills(row[-1]),)
+
+
+_VOLUNTEER_LISTING = f"""
+    SELECT V.VolunteerID, V.FirstName ||' '|| V.LastName AS Fullname,
+           (strftime('%Y', 'now') - strftime('%Y', DateOfBirth)) - (CASE WHEN strftime('%m-%d', 'now') < strftime('%m-%d', DateOfBirth) THEN 1 ELSE 0 END) AS Age,
+           V.Email, V.Phone, V.Availability, GROUP_CONCAT(S.Name, char({ord(SKILL_SEPARATOR)})) AS Skills
+    FROM Volunteers V
+    LEFT JOIN VolunteerSkills VS ON V.VolunteerID = VS.VolunteerID
+    LEFT JOIN Skills S ON VS.SkillID = S.SkillID
+    {{where}}
+    GROUP BY V.VolunteerID ORDER BY V.FirstName"""
+
+list_volunteers = Query(
+    "list_volunteers",
+    _VOLUNTEER_LISTING.format(where=""),
+    VolunteerListing, _with_parsed_skills
+)
+
+list_volunteers_by_skill = Query(
+    "list_volunteers_by_skill",
+    _VOLUNTEER_LISTING.format(where="WHERE S.Name LIKE ?"),
+    VolunteerListing, _with_parsed_skills
+)
+
+list_own_events = Query(
+    "list_own_events",
+    """SELECT e.EventID, e.Name, e.Date, e.Location, e.Status, o.Name AS OrgName
+       FROM Events e
+       JOIN Organisations o ON e.OrganisationID = o.OrganisationID
+       WHERE e.OrganisationID = ? ORDER BY e.Date""",
+    EventListing
+)
+
+list_other_events = Query(
+    "list_other_events",
+    """SELECT e.EventID, e.Name, e.Date, e.Location, e.Status, o.Name AS OrgName
+       FROM Events e
+       JOIN Organisations o ON e.OrganisationID = o.OrganisationID
+       WHERE e.OrganisationID != ? ORDER BY e.Date""",
+    EventListing
+)
+
+list_events_for_volunteer = Query(
+    "list_events_for_volunteer",
+    """SELECT e.EventID, e.Name, e.Date, e.Location, e.Status, o.Name AS OrgName, s.Status AS signup_status
+       FROM Events e
+       JOIN Organisations o ON e.OrganisationID = o.OrganisationID
+       LEFT JOIN Signups s ON e.EventID = s.EventID AND s.VolunteerID = ?
+       ORDER BY e.Date""",
+    VolunteerEventListing
+)
+
+SignupChange = namedtuple(
+    "SignupChange",
+    "Seq Action SignupID EventID VolunteerID Status RoleID RoleName RoleDescription "
+    "FirstName LastName Email Phone EventName Date Location OrgName"
+)
+
+_SIGNUP_CHANGES = """
+    SELECT c.Seq, c.Action, c.SignupID, c.EventID, c.VolunteerID, c.Status, c.RoleID,
+           r.Name AS RoleName, r.Description AS RoleDescription,
+           v.FirstName, v.LastName, v.Email, v.Phone,
+           e.Name AS EventName, e.Date, e.Location, o.Name AS OrgName
+    FROM SignupChanges c
+    LEFT JOIN Volunteers v ON c.VolunteerID = v.VolunteerID
+    LEFT JOIN Roles r ON c.RoleID = r.RoleID
+    LEFT JOIN Events e ON c.EventID = e.EventID
+    LEFT JOIN Organisations o ON e.OrganisationID = o.OrganisationID
+    {where}
+    ORDER BY c.Seq"""
+
+signup_change = Query(
+    "signup_change",
+    _SIGNUP_CHANGES.format(where="WHERE c.Seq = ?"),
+    SignupChange
+)
+
+signup_changes_for_event = Query(
+    "signup_changes_for_event",
+    _SIGNUP_CHANGES.format(where="WHERE c.EventID = ? AND c.Seq > ?"),
+    SignupChange
+)
+
+signup_changes_for_volunteer = Query(
+    "signup_changes_for_volunteer",
+    _SIGNUP_CHANGES.format(where="WHERE c.VolunteerID = ? AND c.Seq > ?"),
+    SignupChange
+)
@@ -1,4 +1,6 @@
 -- Drop tables if exist (reverse order of dependencies)
+DROP TABLE IF EXISTS FeedStamps;
+DROP TABLE IF EXISTS SignupChanges;
 DROP TABLE IF EXISTS Signups;
 DROP TABLE IF EXISTS EventSkills;
 DROP TABLE IF EXISTS VolunteerSkills;
@@ -95,3 +97,26 @@ CREATE TABLE Signups (
     FOREIGN KEY (VolunteerID) REFERENCES Volunteers(VolunteerID) ON DELETE CASCADE,
     FOREIGN KEY (RoleID) REFERENCES Roles(RoleID) ON DELETE SET NULL
 );
+
+-- FeedStamps Table (per-account change stamp for calendar feeds)
+CREATE TABLE FeedStamps (
+    AccountType TEXT(20) NOT NULL,
+    AccountID INTEGER NOT NULL,
+    Version INTEGER NOT NULL DEFAULT 0,
+    ModifiedAt INTEGER NOT NULL,
+    PRIMARY KEY (AccountType, AccountID)
+);
+
+-- SignupChanges Table (append-only log of Signups inserts, updates and deletes)
+CREATE TABLE SignupChanges (
+    Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    Action TEXT(10) NOT NULL,
+    SignupID INTEGER NOT NULL,
+    EventID INTEGER NOT NULL,
+    VolunteerID INTEGER NOT NULL,
+    RoleID INTEGER,
+    Status TEXT(20),
+    ChangedAt INTEGER NOT NULL
+);
+CREATE INDEX idx_signupchanges_event ON SignupChanges (EventID, Seq);
+CREATE INDEX idx_signupchanges_volunteer ON SignupChanges (VolunteerID, Seq);